@@ -0,0 +1,534 @@
+"""
+GGR over integer-encoded tables.
+
+Same greedy splits and PHC as ggr() when the FD rules hold on the table, but
+values are replaced by integer codes into a sorted dictionary with a per-code
+length array, so that each recursion step scores all distinct values of a
+column with one sort and a few vectorized operations instead of one
+hitcount() scan per value. The recursion runs on an explicit stack writing
+into preallocated output arrays, and one engine invocation can order many
+tables at once: the pending subproblems of all tables are scanned in
+batches, with one argsort by (subproblem, key column, code) and segmented
+reductions per batch rather than per subproblem.
+
+Each step starts with a statistics pass over its rows (section 5 of the
+algorithm-improvements report): every FD group is scanned through a single
+key column, and columns whose values are all distinct are dropped from the
+candidates of the whole subtree and moved to the end of the column order.
+The step terminates without splitting when no value repeats (section 1) or
+when the remaining columns form one FD group. In the first case the rows
+keep their input order. In the second they are sorted by the code of the
+group's key, so the groups of rows sharing a value come out in code order
+rather than in ggr()'s order of decreasing hit count. Either way only the
+row order differs from ggr(), with fewer recursion steps: every group of
+rows sharing a value stays contiguous, so PHC is the same.
+
+Results use the compact permutation format `Ordering`: the original row index
+of each output row plus an (n_rows, n_cols) array of column orders; the
+reordered values are `table[row_order[:, None], col_orders]`.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Callable
+from typing import NamedTuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Batch size of order_encoded(), in (row, key column) entries
+_BATCH_ENTRIES = 1 << 22
+
+
+class Ordering(NamedTuple):
+    """GGR result in compact permutation format."""
+
+    phc: float
+    row_order: NDArray
+    col_orders: NDArray
+    recursion_count: int
+
+    def reordered(self, table: NDArray) -> NDArray:
+        """Reordered values of `table` (the table this ordering was computed for)."""
+        return table[self.row_order[:, None], self.col_orders]
+
+
+class ColumnStats(NamedTuple):
+    """Distinct values of a column, as np.unique(return_inverse, return_counts)."""
+
+    sorted_idx: NDArray  # stable argsort of the column
+    uniq: NDArray
+    inverse: NDArray
+    value_counts: NDArray
+
+
+def encode_tables(
+    tables: list[NDArray], token_len: Callable[[str], float] = len
+) -> tuple[list[NDArray], NDArray]:
+    """
+    Encode tables into one concatenated code buffer with a shared dictionary.
+
+    Codes follow the sorted order of the values, so iterating codes in
+    increasing order visits values in the same order as np.unique() on the
+    original strings.
+
+    Args:
+        tables: Tables as 2D numpy arrays of strings
+        token_len: Length of a value (characters by default, as in ggr())
+
+    Returns:
+        Tuple of (codes, lengths) where codes[t] is a view of table t in the
+        concatenated code buffer and lengths[code] is the length of its value
+    """
+    sizes = [table.size for table in tables]
+    offsets = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+    flat = np.empty(offsets[-1], dtype=object)
+    for table, start, end in zip(tables, offsets[:-1], offsets[1:]):
+        flat[start:end] = table.ravel()
+
+    values, buffer = np.unique(flat, return_inverse=True)
+    buffer = buffer.astype(np.int64, copy=False)
+    lengths = np.fromiter(map(token_len, values), dtype=np.float64, count=len(values))
+    codes = [
+        buffer[start:end].reshape(table.shape)
+        for table, start, end in zip(tables, offsets[:-1], offsets[1:])
+    ]
+    return codes, lengths
+
+
+def fd_lookup(functional_deps: list[list[int]], n_cols: int) -> list[list[int]]:
+    """Inferred columns of each column (see get_inferred_cols() in ggr)."""
+    inferred: list[list[int]] = [[] for _ in range(n_cols)]
+    for group in functional_deps:
+        for c in group:
+            if not inferred[c]:
+                inferred[c] = [g for g in group if g != c]
+    return inferred
+
+
+def order_encoded(
+    codes: list[NDArray],
+    lengths: NDArray,
+    functional_deps: list[list[list[int]]],
+    root_stats: list[list[ColumnStats] | None] | None = None,
+    capacity: float = math.inf,
+) -> list[Ordering]:
+    """
+    Run GGR on several encoded tables in one engine invocation.
+
+    Args:
+        codes: Encoded tables, 2D integer arrays of codes
+        lengths: Length of the value of each code
+        functional_deps: FD groups of each table
+        root_stats: Optional precomputed column_stats() of every column of
+                    each table (None entries are computed as usual); the
+                    first step of a table then needs no sorting
+        capacity: Prefix cache budget, in units of `lengths`; shared fields
+                  only count towards a hit count for the part of the prompt
+                  prefix that fits into the budget (see _scan_subproblems())
+
+    Returns:
+        One Ordering per table
+
+    Raises:
+        ValueError: If `functional_deps` does not have one entry per table
+    """
+    n_tables = len(codes)
+    if len(functional_deps) != n_tables:
+        raise ValueError(f"{len(functional_deps)} FD lists for {n_tables} tables")
+    inferred = [fd_lookup(fds, t.shape[1]) for t, fds in zip(codes, functional_deps)]
+    scores = [0.0] * n_tables
+    counts = [0] * n_tables
+    out_rows = [np.empty(t.shape[0], dtype=np.int64) for t in codes]
+    out_cols = [np.empty(t.shape, dtype=np.int64) for t in codes]
+    # All tables are scanned from one flat code buffer
+    flat = np.concatenate([t.ravel() for t in codes] + [np.empty(0, dtype=np.int64)])
+    bases = np.concatenate(([0], np.cumsum([t.size for t in codes], dtype=np.int64)))
+
+    # Explicit stack of subproblems:
+    # (table, rows, candidate cols, pruned cols, prefix cols, output offset).
+    # Matching rows are placed before the remaining rows, as in ggr().
+    stack: list[tuple[int, NDArray, list[int], list[int], list[int], int]] = [
+        (t, np.arange(table.shape[0]), list(range(table.shape[1])), [], [], 0)
+        for t, table in enumerate(codes)
+        if table.shape[0] > 0
+    ]
+    while stack:
+        # Pop pending subproblems of all tables until the batch is large
+        # enough, and scan them together
+        batch = []
+        problems = []
+        n_entries = 0
+        while stack and n_entries < _BATCH_ENTRIES:
+            task = stack.pop()
+            t, rows, cols, pruned, prefix, start = task
+            counts[t] += 1
+
+            # Base case - single row
+            if len(rows) == 1:
+                out_rows[t][start] = rows[0]
+                out_cols[t][start] = prefix + cols + pruned
+                continue
+
+            keys = fd_keys(cols, inferred[t])
+            # Budget left after the prefix shared by all rows of the subproblem
+            budget = capacity
+            if capacity < math.inf and prefix:
+                budget -= float(lengths[codes[t][rows[0], prefix]].sum())
+            # Only the first step of a table (all rows, nothing split yet) has
+            # no prefix and starts at offset 0
+            key_stats = None
+            if root_stats is not None and root_stats[t] is not None:
+                if not prefix and start == 0:
+                    key_stats = [root_stats[t][k] for k in keys]
+            batch.append((task, keys))
+            problems.append(
+                _Subproblem(
+                    int(bases[t]),
+                    codes[t].shape[1],
+                    rows,
+                    keys,
+                    inferred[t],
+                    budget,
+                    key_stats,
+                )
+            )
+            n_entries += len(rows) * len(keys)
+        if not batch:
+            continue
+
+        scans = _scan_subproblems(flat, lengths, problems)
+        for ((t, rows, cols, pruned, prefix, start), keys), scan in zip(batch, scans):
+            end = start + len(rows)
+
+            # Base case - the columns form one FD group (or a single column):
+            # sort rows by the group key
+            if len(keys) == 1:
+                key = keys[0]
+                scores[t] += scan.key_hc
+                out_rows[t][start:end] = scan.sorted_rows
+                out_cols[t][start:end] = prefix + [key] + inferred[t][key] + pruned
+                continue
+
+            # Base case - no value repeats: no two rows can share a prefix
+            if scan.max_hc <= 0:
+                out_rows[t][start:end] = rows
+                out_cols[t][start:end] = prefix + cols + pruned
+                continue
+
+            # Singleton-only columns cannot score anywhere in this subtree
+            if scan.singletons:
+                dropped = set(scan.singletons).union(
+                    *(inferred[t][c] for c in scan.singletons)
+                )
+                cols = [c for c in cols if c not in dropped]
+                pruned = sorted(pruned + list(dropped))
+
+            scores[t] += scan.max_hc
+            best_cols = [scan.best_col] + inferred[t][scan.best_col]
+            remaining_cols = [c for c in cols if c not in best_cols]
+            matching = scan.matching
+
+            if len(scan.rest) > 0:
+                rest_start = start + len(matching)
+                stack.append((t, scan.rest, cols, pruned, prefix, rest_start))
+            if remaining_cols:
+                stack.append(
+                    (t, matching, remaining_cols, pruned, prefix + best_cols, start)
+                )
+            else:
+                out_rows[t][start : start + len(matching)] = matching
+                out_cols[t][start : start + len(matching)] = prefix + best_cols + pruned
+
+    return [
+        Ordering(scores[t], out_rows[t], out_cols[t], counts[t]) for t in range(n_tables)
+    ]
+
+
+def fd_keys(cols: list[int], inferred: list[list[int]]) -> list[int]:
+    """
+    Key column of each FD group among `cols`: its first column in `cols`.
+
+    Rows sharing a key value share the values of the whole group, and every
+    column of the group has the same hit count for them, so only the key
+    needs to be scanned. A column outside any FD group is its own key.
+    """
+    keys = []
+    covered: set[int] = set()
+    for c in cols:
+        if c not in covered:
+            keys.append(c)
+            covered.update(inferred[c])
+    return keys
+
+
+def scan_keys(
+    sub: NDArray,
+    keys: list[int],
+    inferred: list[list[int]],
+    lengths: NDArray,
+    key_stats: list[ColumnStats] | None = None,
+    budget: float = math.inf,
+) -> tuple[float, int, int, list[int]]:
+    """
+    Statistics pass over the key columns of a subproblem.
+
+    Finds the value with maximum hit count (lines 17-23 of GGR) and the keys
+    whose values are all distinct. The first value in key order, then code
+    order, wins on ties, as in ggr().
+
+    Args:
+        sub: Encoded (sub)table
+        keys: Key columns (see fd_keys())
+        inferred: Inferred columns of each column (see fd_lookup())
+        lengths: Length of the value of each code
+        key_stats: Optional column_stats() of each key over the rows of `sub`
+        budget: Prefix cache budget left for the fields of a group
+
+    Returns:
+        Tuple of (max_hit_count, best_col, best_value_code, singleton_keys);
+        max_hit_count is 0 and best_col is -1 if no value has a positive
+        hit count
+    """
+    n_rows, n_cols = sub.shape
+    problem = _Subproblem(
+        0, n_cols, np.arange(n_rows), keys, inferred, budget, key_stats
+    )
+    scan = _scan_subproblems(np.ravel(sub), lengths, [problem])[0]
+    return scan.max_hc, scan.best_col, scan.best_value, scan.singletons
+
+
+class _Subproblem(NamedTuple):
+    """Rows and key columns of one table in a flat code buffer."""
+
+    base: int  # offset of the table in the buffer
+    n_cols: int
+    rows: NDArray
+    keys: list[int]
+    inferred: list[list[int]]
+    budget: float
+    key_stats: list[ColumnStats] | None  # over all rows of the table
+
+
+class _KeyScan(NamedTuple):
+    """Result of the statistics pass over one subproblem."""
+
+    max_hc: float  # 0 if no value has a positive hit count
+    best_col: int  # -1 if no value has a positive hit count
+    best_value: int
+    singletons: list[int]
+    matching: NDArray  # rows holding the best value, in row order
+    rest: NDArray  # the other rows, in row order
+    sorted_rows: NDArray  # rows stably sorted by the first key
+    key_hc: float  # sum of the hit counts of all values of the first key
+
+
+def _scan_subproblems(
+    flat: NDArray, lengths: NDArray, problems: list[_Subproblem]
+) -> list[_KeyScan]:
+    """
+    Statistics pass over many subproblems at once.
+
+    Every (subproblem, key) pair is a segment of one entry array holding the
+    code of each row in that key. One argsort by (segment, code) sorts all
+    segments, and the runs of equal codes give the distinct values of every
+    key, so hit counts, singleton keys and the best value of each subproblem
+    come from a few segmented numpy reductions, however many subproblems and
+    tables are in the batch.
+    """
+    n_problems = len(problems)
+    n_keys = [len(p.keys) for p in problems]
+    n_rows = np.fromiter((len(p.rows) for p in problems), np.int64, n_problems)
+    prob_first_seg = np.concatenate(([0], np.cumsum(n_keys)[:-1])).astype(np.int64)
+    seg_prob = np.repeat(np.arange(n_problems), n_keys)
+    n_segs = len(seg_prob)
+    seg_size = n_rows[seg_prob]
+    seg_start = np.concatenate(([0], np.cumsum(seg_size)))
+    seg_key = np.fromiter((k for p in problems for k in p.keys), np.int64, n_segs)
+    seg_base = np.fromiter((p.base for p in problems), np.int64, n_problems)[seg_prob]
+    seg_n_cols = np.fromiter((p.n_cols for p in problems), np.int64, n_problems)
+    n_entries = int(seg_start[-1])
+
+    # Entries: the rows of each subproblem once per key, in row order
+    entry_seg = np.repeat(np.arange(n_segs), seg_size)
+    entry_row = np.concatenate([p.rows for p in problems for _ in p.keys])
+    entry_cell = entry_row * np.repeat(seg_n_cols[seg_prob], seg_size)
+    entry_cell += np.repeat(seg_base, seg_size)
+    entry_code = flat[entry_cell + np.repeat(seg_key, seg_size)]
+
+    # Sort each segment by code. Sorting by segment first keeps every segment
+    # in its own range, so segments with precomputed statistics are filled in
+    # directly.
+    stats_segs = [
+        (first + j, stats.sorted_idx)
+        for p, first in zip(problems, prob_first_seg.tolist())
+        if p.key_stats is not None
+        for j, stats in enumerate(p.key_stats)
+    ]
+    if stats_segs:
+        perm = np.empty(n_entries, dtype=np.int64)
+        to_sort = np.ones(n_segs, dtype=bool)
+        for seg, sorted_idx in stats_segs:
+            perm[seg_start[seg] : seg_start[seg + 1]] = seg_start[seg] + sorted_idx
+            to_sort[seg] = False
+        sel = np.flatnonzero(to_sort[entry_seg])
+        perm[sel] = sel[
+            _argsort_segments(entry_seg[sel], entry_code[sel], n_segs, len(lengths))
+        ]
+    else:
+        perm = _argsort_segments(entry_seg, entry_code, n_segs, len(lengths))
+    sorted_code = entry_code[perm]
+    sorted_row = entry_row[perm]
+
+    # Runs of equal codes: the distinct values of each segment
+    is_start = np.empty(n_entries, dtype=bool)
+    is_start[0] = True
+    np.not_equal(sorted_code[1:], sorted_code[:-1], out=is_start[1:])
+    is_start[seg_start[:-1]] = True
+    run_start = np.flatnonzero(is_start)
+    n_runs = len(run_start)
+    run_count = np.diff(np.append(run_start, n_entries))
+    run_seg = entry_seg[run_start]
+    run_code = sorted_code[run_start]
+    seg_n_runs = np.bincount(run_seg, minlength=n_segs)
+    seg_run_start = np.concatenate(([0], np.cumsum(seg_n_runs)[:-1]))
+
+    # Vectorized hitcount() of all runs:
+    #   tot_len = len(v)² + Σ_{c' ∈ inferred cols} avg_{r ∈ R_v}(len(T[r, c']))²
+    # With a finite budget, the group's fields are taken in prompt order and a
+    # field only counts if it still fits into the budget, as a prefix cache of
+    # that size can only serve those fields. Within a run, sorted entries keep
+    # row order, so the sums of lengths add up in the same order as in ggr().
+    budget = np.fromiter((p.budget for p in problems), np.float64, n_problems)
+    budget = budget[seg_prob[run_seg]]
+    value_len = lengths[run_code]
+    fits = value_len <= budget
+    tot_len = np.where(fits, value_len, 0.0) ** 2
+    remaining = np.where(fits, budget - value_len, 0.0)
+    seg_inferred = [p.inferred[k] for p in problems for k in p.keys]
+    if any(seg_inferred):
+        run_id = np.cumsum(is_start) - 1
+        sorted_cell = entry_cell[perm]
+    for i in range(max(map(len, seg_inferred))):
+        seg_col = np.fromiter(
+            (cols[i] if len(cols) > i else -1 for cols in seg_inferred),
+            np.int64,
+            n_segs,
+        )
+        has_col = seg_col >= 0
+        mask = has_col[entry_seg]
+        weights = lengths[flat[sorted_cell[mask] + seg_col[entry_seg[mask]]]]
+        sums = np.bincount(run_id[mask], weights=weights, minlength=n_runs)
+        runs = has_col[run_seg]
+        avg_len = sums[runs] / run_count[runs]
+        fits = avg_len <= remaining[runs]
+        tot_len[runs] += np.where(fits, avg_len, 0.0) ** 2
+        remaining[runs] = np.where(fits, remaining[runs] - avg_len, 0.0)
+    hc = tot_len * (run_count - 1)
+    seg_hc = np.add.reduceat(hc, seg_run_start)
+
+    # Best value of each subproblem among its keys that are not all-distinct:
+    # the first maximum in key order, then code order
+    singleton = seg_n_runs == seg_size
+    hc = np.where(singleton[run_seg], -1.0, hc)
+    prob_run_start = seg_run_start[prob_first_seg]
+    max_hc = np.maximum.reduceat(hc, prob_run_start)
+    is_max = hc == max_hc[seg_prob[run_seg]]
+    best_run = np.minimum.reduceat(
+        np.where(is_max, np.arange(n_runs), n_runs), prob_run_start
+    )
+    best_seg = run_seg[best_run]
+
+    # Rows without the best value, in row order
+    row_offset = np.concatenate(([0], np.cumsum(n_rows)[:-1]))
+    best_entries = np.arange(int(n_rows.sum()))
+    best_entries += np.repeat(seg_start[best_seg] - row_offset, n_rows)
+    is_rest = entry_code[best_entries] != np.repeat(run_code[best_run], n_rows)
+    rest_rows = entry_row[best_entries[is_rest]]
+    rest_offset = np.concatenate(([0], np.cumsum(n_rows - run_count[best_run])))
+
+    # Per-subproblem results as Python scalars and slices
+    max_hc = max_hc.tolist()
+    best_col = seg_key[best_seg].tolist()
+    best_value = run_code[best_run].tolist()
+    match_start = run_start[best_run].tolist()
+    match_end = (run_start[best_run] + run_count[best_run]).tolist()
+    rest_offset = rest_offset.tolist()
+    first_seg = prob_first_seg.tolist()
+    first_start = seg_start[prob_first_seg].tolist()
+    key_hc = seg_hc[prob_first_seg].tolist()
+    singleton = singleton.tolist()
+    scans = []
+    for i, p in enumerate(problems):
+        positive = max_hc[i] > 0
+        f = first_seg[i]
+        scans.append(
+            _KeyScan(
+                max_hc[i] if positive else 0.0,
+                best_col[i] if positive else -1,
+                best_value[i] if positive else -1,
+                [k for k, s in zip(p.keys, singleton[f : f + len(p.keys)]) if s],
+                sorted_row[match_start[i] : match_end[i]],
+                rest_rows[rest_offset[i] : rest_offset[i + 1]],
+                sorted_row[first_start[i] : first_start[i] + len(p.rows)],
+                key_hc[i],
+            )
+        )
+    return scans
+
+
+def _argsort_segments(
+    entry_seg: NDArray, entry_code: NDArray, n_segs: int, n_codes: int
+) -> NDArray:
+    """Stable argsort of entries by (segment, code)."""
+    sort_key = entry_seg * n_codes + entry_code
+    n_entries = len(sort_key)
+    if n_segs * n_codes * n_entries < 1 << 62:
+        # Unique keys in entry order: the faster unstable sort is stable here
+        sort_key *= n_entries
+        sort_key += np.arange(n_entries)
+        return np.argsort(sort_key)
+    return np.argsort(sort_key, kind="stable")
+
+
+def column_stats(column: NDArray) -> ColumnStats:
+    """Distinct values of an encoded column, for reuse as `root_stats`."""
+    sorted_idx = np.argsort(column, kind="stable")
+    return ColumnStats(sorted_idx, *_runs(column, sorted_idx, True))
+
+
+def _runs(
+    values: NDArray, sorted_idx: NDArray, with_inverse: bool
+) -> tuple[NDArray, NDArray | None, NDArray]:
+    """
+    np.unique(values, return_inverse, return_counts=True) given argsort(values).
+    """
+    sorted_values = values[sorted_idx]
+    is_start = np.empty(len(values), dtype=bool)
+    is_start[0] = True
+    np.not_equal(sorted_values[1:], sorted_values[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    value_counts = np.empty(len(starts), dtype=np.int64)
+    value_counts[:-1] = starts[1:] - starts[:-1]
+    value_counts[-1] = len(values) - starts[-1]
+    inverse = None
+    if with_inverse:
+        inverse = np.empty(len(values), dtype=np.int64)
+        inverse[sorted_idx] = np.cumsum(is_start) - 1
+    return sorted_values[starts], inverse, value_counts
+
+
+def ggr_encoded(table: NDArray, functional_deps: list[list[int]]) -> Ordering:
+    """
+    GGR on a single table through the encoded engine.
+
+    Args:
+        table: Input table as a 2D numpy array of strings
+        functional_deps: List of disjoint sets of mutually dependent column indices
+
+    Returns:
+        Ordering of the table
+    """
+    codes, lengths = encode_tables([table])
+    return order_encoded(codes, lengths, [functional_deps])[0]
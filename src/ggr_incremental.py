@@ -0,0 +1,374 @@
+"""
+Incremental GGR re-ordering for appended and updated rows.
+
+`IncrementalOrdering` keeps the group tree of the GGR recursion: at each node
+the chain of chosen (column, value) splits, in the order ggr() made them, and
+the rows that fell through all of them. New rows are routed down the tree to
+the first split they match, so they land in the group ggr() would most
+likely have put them in. Split chains are built with the statistics pass of
+the encoded engine, so a chain ends as soon as no value repeats and the tree
+has no nodes for the long tail of distinct values. Every node counts the
+rows routed in or out since it was built; refresh() re-runs GGR only on the
+topmost subtrees whose count exceeds `threshold` times their built size.
+Keeping a large ordering fresh therefore costs time proportional to the
+changed rows and the subtrees they invalidate, not to the table.
+
+The state can be persisted with save() and restored with load().
+"""
+
+from __future__ import annotations
+
+import pickle
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ggr import compute_phc
+from ggr_encoded import encode_tables, fd_keys, fd_lookup, ggr_encoded, scan_keys
+
+
+@dataclass(eq=False)
+class _Split:
+    """A chosen (column, value) with the group of rows sharing it."""
+
+    col: int
+    value: str
+    best_cols: list[int]
+    child: _Node | None = None  # group recursion on the remaining columns
+    # Group rows if no columns remain, as an ordered set (O(1) insert and remove)
+    rows: dict[int, None] = field(default_factory=dict)
+    tail_cols: list[int] = field(default_factory=list)  # pruned columns of `rows`
+
+
+@dataclass(eq=False)
+class _Node:
+    """One GGR subproblem: its split chain and the rows left after the last split."""
+
+    cols: list[int]
+    parent: _Node | None
+    pruned: list[int] = field(default_factory=list)  # singleton columns, last in order
+    parent_split: int = -1
+    n_built: int = 0
+    n_changed: int = 0
+    splits: list[_Split] = field(default_factory=list)
+    index: dict[tuple[int, str], int] = field(default_factory=dict)
+    tail: dict[int, None] = field(default_factory=dict)  # ordered set, as `rows`
+    tail_cols: list[int] = field(default_factory=list)  # column order of the tail
+    sort_col: int = -1  # column the tail is sorted by when emitted, if any
+    dirty: set[int] = field(default_factory=set)  # splits with changed children
+
+
+class IncrementalOrdering:
+    """
+    Persisted GGR ordering state supporting appends, updates and partial refresh.
+    """
+
+    def __init__(
+        self,
+        table: NDArray,
+        functional_deps: list[list[int]],
+        threshold: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            table: Input table as a 2D numpy array of strings
+            functional_deps: List of disjoint sets of mutually dependent column indices
+            threshold: Fraction of a subtree's built size that may change
+                       before refresh() re-runs GGR on it
+        """
+        self.functional_deps = functional_deps
+        self.threshold = threshold
+        self.n_cols = table.shape[1]
+        self._inferred = fd_lookup(functional_deps, self.n_cols)
+        self._rows: list[list[str]] = [list(row) for row in table]
+        self._location: dict[int, tuple[_Node, dict[int, None]]] = {}
+        self._root = self._build(
+            list(range(len(self._rows))), list(range(self.n_cols)), [], None
+        )
+
+    # ── building ──────────────────────────────────────────────────────────
+
+    def _build(
+        self,
+        row_ids: list[int],
+        cols: list[int],
+        pruned: list[int],
+        parent: _Node | None,
+    ) -> _Node:
+        """Run GGR on the given rows and columns and return the subtree."""
+        if len(row_ids) == 0:
+            return _Node(cols, parent, pruned, tail_cols=cols + pruned)
+        values = np.empty((len(row_ids), self.n_cols), dtype=object)
+        for i, r in enumerate(row_ids):
+            values[i] = self._rows[r]
+        codes, lengths = encode_tables([values])
+        positions = np.arange(len(row_ids))
+        return self._build_codes(
+            values,
+            codes[0],
+            lengths,
+            np.asarray(row_ids),
+            positions,
+            cols,
+            pruned,
+            parent,
+        )
+
+    def _build_codes(
+        self,
+        values: NDArray,
+        codes: NDArray,
+        lengths: NDArray,
+        row_ids: NDArray,
+        positions: NDArray,
+        cols: list[int],
+        pruned: list[int],
+        parent: _Node | None,
+    ) -> _Node:
+        node = _Node(cols, parent, pruned, n_built=len(positions))
+        live = cols
+        rest = positions
+        # Walk the chain of splits on the remaining rows, as in ggr() line 25,
+        # with the statistics pass of order_encoded()
+        while len(rest) > 0:
+            if len(rest) == 1:
+                node.tail = {int(row_ids[rest[0]]): None}
+                break
+            keys = fd_keys(live, self._inferred)
+            if len(keys) == 1:
+                # The columns form one FD group (or a single column): sort by its key
+                key = keys[0]
+                live = [key] + self._inferred[key]
+                sorted_idx = np.argsort(codes[rest, key], kind="stable")
+                node.tail = dict.fromkeys(row_ids[rest[sorted_idx]].tolist())
+                node.sort_col = key
+                break
+
+            max_hc, best_col, best_code, singletons = scan_keys(
+                codes[rest], keys, self._inferred, lengths
+            )
+            if max_hc <= 0:
+                # No value repeats: no two rows can share a prefix
+                node.tail = dict.fromkeys(row_ids[rest].tolist())
+                break
+            if singletons:
+                # Singleton-only columns cannot score anywhere in this subtree
+                dropped = set(singletons).union(
+                    *(self._inferred[c] for c in singletons)
+                )
+                live = [c for c in live if c not in dropped]
+                pruned = sorted(pruned + list(dropped))
+
+            matching_mask = codes[rest, best_col] == best_code
+            matching, rest = rest[matching_mask], rest[~matching_mask]
+
+            split = _Split(
+                best_col,
+                values[matching[0], best_col],
+                [best_col] + self._inferred[best_col],
+            )
+            remaining_cols = [c for c in live if c not in split.best_cols]
+            if remaining_cols:
+                split.child = self._build_codes(
+                    values,
+                    codes,
+                    lengths,
+                    row_ids,
+                    matching,
+                    remaining_cols,
+                    pruned,
+                    node,
+                )
+                split.child.parent_split = len(node.splits)
+            else:
+                split.rows = dict.fromkeys(row_ids[matching].tolist())
+                split.tail_cols = pruned
+                for r in split.rows:
+                    self._location[r] = (node, split.rows)
+            node.index[(split.col, split.value)] = len(node.splits)
+            node.splits.append(split)
+
+        node.tail_cols = live + pruned
+        for r in node.tail:
+            self._location[r] = (node, node.tail)
+        return node
+
+    # ── changes ───────────────────────────────────────────────────────────
+
+    def _mark_changed(self, node: _Node) -> None:
+        """Count a routed row on `node` and all its ancestors."""
+        while node is not None:
+            node.n_changed += 1
+            if node.parent is not None:
+                node.parent.dirty.add(node.parent_split)
+            node = node.parent
+
+    def _insert(self, r: int) -> None:
+        values = self._rows[r]
+        node = self._root
+        while True:
+            matches = [
+                pos
+                for c in node.cols
+                if (pos := node.index.get((c, values[c]))) is not None
+            ]
+            if not matches:
+                node.tail[r] = None
+                self._location[r] = (node, node.tail)
+                break
+            split = node.splits[min(matches)]
+            if split.child is None:
+                split.rows[r] = None
+                self._location[r] = (node, split.rows)
+                break
+            node = split.child
+        self._mark_changed(node)
+
+    def _remove(self, r: int) -> None:
+        node, rows = self._location.pop(r)
+        del rows[r]
+        self._mark_changed(node)
+
+    def append(self, rows: NDArray) -> list[int]:
+        """
+        Append rows and route them to their groups.
+
+        Args:
+            rows: New rows as a 2D numpy array of strings
+
+        Returns:
+            Row indices assigned to the new rows
+        """
+        row_ids = []
+        for row in rows:
+            r = len(self._rows)
+            self._rows.append(list(row))
+            self._insert(r)
+            row_ids.append(r)
+        return row_ids
+
+    def update(self, row_ids: list[int], rows: NDArray) -> None:
+        """
+        Replace the values of existing rows and re-route them.
+
+        Args:
+            row_ids: Indices of the rows to update
+            rows: New values, one row per index
+        """
+        for r, row in zip(row_ids, rows):
+            self._remove(r)
+            self._rows[r] = list(row)
+            self._insert(r)
+
+    def refresh(self) -> int:
+        """
+        Re-run GGR on the topmost subtrees changed beyond the threshold.
+
+        Returns:
+            Number of rows re-ordered
+        """
+        reordered = 0
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.n_changed > self.threshold * max(node.n_built, 1):
+                row_ids = self._collect(node)
+                new = self._build(row_ids, node.cols, node.pruned, node.parent)
+                new.parent_split = node.parent_split
+                if node.parent is None:
+                    self._root = new
+                else:
+                    node.parent.splits[node.parent_split].child = new
+                reordered += len(row_ids)
+                continue
+            for pos in node.dirty:
+                stack.append(node.splits[pos].child)
+            node.dirty = set()
+        return reordered
+
+    def _collect(self, node: _Node) -> list[int]:
+        """All row indices in the subtree of `node`."""
+        row_ids = []
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            for split in n.splits:
+                if split.child is not None:
+                    stack.append(split.child)
+                else:
+                    row_ids.extend(split.rows)
+            row_ids.extend(self._tail(n))
+        return row_ids
+
+    def _tail(self, node: _Node) -> Iterable[int]:
+        """Tail rows of `node` in output order."""
+        if node.sort_col < 0:
+            return node.tail
+        # Stable: routed rows follow the built rows of the same value
+        col = node.sort_col
+        return sorted(node.tail, key=lambda r: self._rows[r][col])
+
+    # ── results ───────────────────────────────────────────────────────────
+
+    def ordering(self) -> tuple[list[list[str]], list[list[int]], list[int]]:
+        """
+        Current ordering in the format of ggr().
+
+        Returns:
+            Tuple of (reordered_values, reordered_col_indices, original_row_indices)
+        """
+        reordered: list[list[str]] = []
+        col_orders: list[list[int]] = []
+        orig_rows: list[int] = []
+
+        def emit(row_ids: Iterable[int], cols: list[int]) -> None:
+            for r in row_ids:
+                reordered.append([self._rows[r][c] for c in cols])
+                col_orders.append(cols)
+                orig_rows.append(r)
+
+        def walk(node: _Node, prefix: list[int]) -> None:
+            for split in node.splits:
+                if split.child is not None:
+                    walk(split.child, prefix + split.best_cols)
+                else:
+                    emit(split.rows, prefix + split.best_cols + split.tail_cols)
+            emit(self._tail(node), prefix + node.tail_cols)
+
+        walk(self._root, [])
+        return reordered, col_orders, orig_rows
+
+    def phc(self) -> float:
+        """PHC of the current ordering."""
+        return compute_phc(self.ordering()[0])
+
+    def drift(self) -> tuple[float, float]:
+        """
+        Compare the current ordering against a full GGR recompute.
+
+        Returns:
+            Tuple of (current_phc, full_recompute_phc)
+        """
+        table = np.empty((len(self._rows), self.n_cols), dtype=object)
+        for i, row in enumerate(self._rows):
+            table[i] = row
+        full = ggr_encoded(table, self.functional_deps)
+        return self.phc(), compute_phc(full.reordered(table).tolist())
+
+    # ── persistence ───────────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        """Persist the ordering state to a file."""
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> IncrementalOrdering:
+        """Restore an ordering state saved with save()."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if not isinstance(state, cls):
+            raise TypeError(f"{path} does not contain an {cls.__name__}")
+        return state
@@ -0,0 +1,199 @@
+"""
+Join-aware GGR over factorized relations.
+
+LLM-SQL inputs are usually a join of a fact table with dimension tables.
+Instead of materializing the denormalized table, `ggr_join()` takes the fact
+table as integer foreign-key codes plus the dimension tables, and orders the
+join without ever expanding it.
+
+All columns of a dimension are treated as one FD group with its key: rows
+sharing a key share every column of that dimension. The hit count of key `k`
+of dimension `d` is therefore
+
+    HC(k, d) = (Σ_{c ∈ cols(d)} len(D[k, c])²) × (|R_k| − 1)
+
+which matches hitcount() of the materialized table with the dimension
+columns in one FD group. Per-key weights are computed once from the
+dimension tables, so each recursion step costs O(rows × dimensions) over
+integer codes, independent of the dimension widths.
+
+Columns of the (virtual) joined table are the dimension columns laid out
+dimension after dimension. Non-key fact attributes can be passed as a
+degenerate dimension whose rows are the distinct attribute tuples.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def _key_weights(dimension: NDArray) -> NDArray:
+    """Σ len(value)² over the columns of each dimension row."""
+    lengths = np.vectorize(len, otypes=[np.int64])(dimension)
+    return (lengths**2).sum(axis=1).astype(np.float64)
+
+
+def _check_keys(fact: NDArray, dimensions: list[NDArray]) -> None:
+    """Raise ValueError unless fact[:, d] are row indices of dimensions[d]."""
+    if fact.ndim != 2 or fact.shape[1] != len(dimensions):
+        raise ValueError(
+            f"fact table has {fact.shape[1] if fact.ndim == 2 else 0} key columns"
+            f" but {len(dimensions)} dimensions"
+        )
+    if not np.issubdtype(fact.dtype, np.integer) and fact.size > 0:
+        raise ValueError(f"fact table keys must be integers, not {fact.dtype}")
+    for d, dimension in enumerate(dimensions):
+        keys = fact[:, d]
+        if len(keys) and (keys.min() < 0 or keys.max() >= len(dimension)):
+            raise ValueError(
+                f"fact keys of dimension {d} must be in [0, {len(dimension)})"
+            )
+
+
+def join_columns(dimensions: list[NDArray]) -> list[list[int]]:
+    """
+    Virtual column indices of each dimension in the joined table.
+
+    Args:
+        dimensions: Dimension tables as 2D numpy arrays of strings
+
+    Returns:
+        List with the joined-table column indices of each dimension
+    """
+    cols = []
+    offset = 0
+    for dimension in dimensions:
+        cols.append(list(range(offset, offset + dimension.shape[1])))
+        offset += dimension.shape[1]
+    return cols
+
+
+def ggr_join(
+    fact: NDArray, dimensions: list[NDArray]
+) -> tuple[float, NDArray, NDArray, int]:
+    """
+    Greedy Group Recursion over a fact table of foreign-key codes.
+
+    Args:
+        fact: 2D integer array, fact[i, d] is the row of dimensions[d]
+              joined with fact row i
+        dimensions: Dimension tables as 2D numpy arrays of strings
+
+    Returns:
+        Tuple of (prefix_hit_count, reordered_col_indices,
+                  original_row_indices, recursion_count)
+        where reordered_col_indices[i] is the joined-table column order for
+        row i (an array of shape (n_rows, n_joined_cols)) and
+        original_row_indices[i] is the fact row number for row i
+
+    Raises:
+        ValueError: If a foreign key is not a row of its dimension table
+    """
+    fact = np.asarray(fact)
+    _check_keys(fact, dimensions)
+    n_rows, n_dims = fact.shape
+
+    weights = [_key_weights(dimension) for dimension in dimensions]
+    dim_cols = join_columns(dimensions)
+    n_joined = sum(len(cols) for cols in dim_cols)
+
+    out_rows = np.empty(n_rows, dtype=np.int64)
+    out_cols = np.empty((n_rows, n_joined), dtype=np.int64)
+    total_score = 0.0
+    recursion_count = 0
+    if n_rows == 0:
+        return total_score, out_cols, out_rows, recursion_count
+
+    # Explicit stack of subproblems: (rows, remaining dims, prefix dims, output offset).
+    # Matching rows are placed before the remaining rows, as in ggr().
+    stack: list[tuple[NDArray, list[int], list[int], int]] = [
+        (np.arange(n_rows), list(range(n_dims)), [], 0)
+    ]
+    while stack:
+        rows, dims, prefix, start = stack.pop()
+        recursion_count += 1
+        order = [c for d in prefix + dims for c in dim_cols[d]]
+
+        # Base case - single row
+        if len(rows) == 1:
+            out_rows[start] = rows[0]
+            out_cols[start] = order
+            continue
+
+        # Base case - single dimension: group rows by key
+        if len(dims) == 1:
+            keys = fact[rows, dims[0]]
+            uniq, counts = np.unique(keys, return_counts=True)
+            total_score += float((weights[dims[0]][uniq] * (counts - 1)).sum())
+            sorted_idx = np.argsort(keys, kind="stable")
+            out_rows[start : start + len(rows)] = rows[sorted_idx]
+            out_cols[start : start + len(rows)] = order
+            continue
+
+        # Find the key with maximum hit count (first one wins on ties)
+        max_hc = 0.0
+        best_dim = -1
+        best_key = -1
+        for d in dims:
+            uniq, counts = np.unique(fact[rows, d], return_counts=True)
+            hc = weights[d][uniq] * (counts - 1)
+            i = int(np.argmax(hc))
+            if hc[i] > max_hc:
+                max_hc = float(hc[i])
+                best_dim = d
+                best_key = uniq[i]
+
+        # No key repeats: no two rows can share a prefix
+        if best_dim < 0:
+            out_rows[start : start + len(rows)] = rows
+            out_cols[start : start + len(rows)] = order
+            continue
+
+        total_score += max_hc
+        matching_mask = fact[rows, best_dim] == best_key
+        matching = rows[matching_mask]
+        rest = rows[~matching_mask]
+        if len(rest) > 0:
+            stack.append((rest, dims, prefix, start + len(matching)))
+        stack.append(
+            (matching, [d for d in dims if d != best_dim], prefix + [best_dim], start)
+        )
+
+    return total_score, out_cols, out_rows, recursion_count
+
+
+def expand_rows(
+    fact: NDArray,
+    dimensions: list[NDArray],
+    col_orders: NDArray,
+    orig_rows: NDArray,
+) -> Iterator[list[str]]:
+    """
+    Lazily materialize reordered rows of the joined table, one at a time.
+
+    Args:
+        fact: Fact table of foreign-key codes, as passed to ggr_join()
+        dimensions: Dimension tables, as passed to ggr_join()
+        col_orders: Column orders returned by ggr_join()
+        orig_rows: Original row indices returned by ggr_join()
+
+    Yields:
+        Field values of each reordered row, in its column order
+
+    Raises:
+        ValueError: If a foreign key is not a row of its dimension table
+    """
+    fact = np.asarray(fact)
+    _check_keys(fact, dimensions)
+    # joined column -> (dimension, column within dimension)
+    col_source = [
+        (d, c) for d, dimension in enumerate(dimensions) for c in range(dimension.shape[1])
+    ]
+    for row, cols in zip(orig_rows, col_orders):
+        keys = fact[row]
+        yield [
+            dimensions[d][keys[d], c] for d, c in (col_source[col] for col in cols)
+        ]
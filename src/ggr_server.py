@@ -0,0 +1,657 @@
+"""
+Async GGR ordering service.
+
+A local asyncio HTTP server (TCP or Unix socket) that accepts tables, queues
+them, coalesces small tables into batched jobs, dispatches work to a process
+pool, and streams back row/column permutations as newline-delimited JSON.
+
+Endpoints:
+    POST /order    body: {"tables": [TABLE, ...], "deadline_ms": float}
+                   TABLE: {"id": any, "rows": [[str, ...], ...],
+                           "functional_deps": [[int, ...], ...],
+                           "deadline_ms": float}
+                   or {"id": any, "path": "table.csv", ...} to reference a
+                   CSV file readable by the server.
+                   Response: one JSON line per table, in completion order:
+                   {"id", "phc", "row_order", "col_orders", "recursion_count",
+                    "latency_ms"} or {"id", "error"}.
+    GET /metrics   Queue depth, in-flight jobs, counters and latency
+                   percentiles as a JSON object.
+
+When the queue cannot take all tables of a request, the whole request is
+rejected with 503 (backpressure); clients should retry later.
+
+Run `python src/ggr_server.py --port 8765` to start the server.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ggr_batch import ggr_many
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    503: "Service Unavailable",
+}
+
+
+def load_csv_table(path: str) -> NDArray:
+    """
+    Load a table reference (CSV file without header) as a 2D object array.
+
+    Args:
+        path: Path to the CSV file
+
+    Returns:
+        Table as a 2D numpy array of strings
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    return np.array(rows, dtype=object)
+
+
+def _check_table(table: NDArray, functional_deps: list[list[int]]) -> None:
+    """
+    Check that a table and its FD groups can be ordered.
+
+    Args:
+        table: Table as a 2D numpy array
+        functional_deps: FD groups of the table
+
+    Raises:
+        ValueError: If the table is not a non-empty 2D table of strings, or the
+                    FD groups are not disjoint lists of column indices
+    """
+    if table.ndim != 2 or table.size == 0:
+        raise ValueError("not a non-empty 2D table")
+    if not all(isinstance(value, str) for value in table.flat):
+        raise ValueError("all cells must be strings")
+    if not isinstance(functional_deps, list):
+        raise ValueError("functional_deps must be a list of column lists")
+    seen: set[int] = set()
+    for group in functional_deps:
+        if not isinstance(group, list):
+            raise ValueError("functional_deps must be a list of column lists")
+        for c in group:
+            if not isinstance(c, int) or isinstance(c, bool):
+                raise ValueError(f"FD column {c!r} is not an integer")
+            if not 0 <= c < table.shape[1]:
+                raise ValueError(
+                    f"FD column {c} out of range for {table.shape[1]} columns"
+                )
+            if c in seen:
+                raise ValueError(f"FD column {c} is in more than one group")
+            seen.add(c)
+
+
+def _check_deadline(deadline_ms: object) -> None:
+    """Check that a deadline is None or a non-negative number of milliseconds."""
+    if deadline_ms is None:
+        return
+    if (
+        not isinstance(deadline_ms, (int, float))
+        or isinstance(deadline_ms, bool)
+        or not 0 <= deadline_ms < math.inf
+    ):
+        raise ValueError(f"deadline_ms must be a non-negative number: {deadline_ms!r}")
+
+
+def _order_tables(
+    jobs: list[tuple[NDArray, list[list[int]]]],
+) -> list[tuple[float, list[int], list[list[int]], int] | Exception]:
+    """
+    Order a batch of tables in one engine invocation (in a pool worker process).
+
+    Only the permutations are returned: the caller already has the values,
+    so shipping the reordered table back would only add pickling cost. If
+    the batch fails, its tables are retried one at a time so that one bad
+    table does not fail the others.
+
+    Args:
+        jobs: List of (table, functional_deps) pairs
+
+    Returns:
+        List of (phc, original_row_indices, reordered_col_indices,
+                 recursion_count) or of the raised exception, per table
+    """
+    try:
+        orderings = ggr_many(
+            [table for table, _ in jobs],
+            per_table_deps=[functional_deps for _, functional_deps in jobs],
+        )
+    except Exception:
+        if len(jobs) == 1:
+            raise
+        results: list = []
+        for job in jobs:
+            try:
+                results.extend(_order_tables([job]))
+            except Exception as e:
+                results.append(e)
+        return results
+    return [
+        (o.phc, o.row_order.tolist(), o.col_orders.tolist(), o.recursion_count)
+        for o in orderings
+    ]
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a table is not ordered before its deadline."""
+
+
+@dataclass
+class _Job:
+    table_id: object
+    table: NDArray
+    functional_deps: list[list[int]]
+    deadline: float | None
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class OrderingServer:
+    """
+    Queueing front-end over a process pool of GGR workers.
+
+    Tables with at most `small_rows` rows are coalesced into batched jobs of
+    up to `batch_rows` total rows (waiting at most `linger_ms` for a batch to
+    fill); larger tables are dispatched to the pool one per job.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_queue: int = 1024,
+        small_rows: int = 512,
+        batch_rows: int = 4096,
+        linger_ms: float = 2.0,
+        default_deadline_ms: float | None = None,
+    ) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.small_rows = small_rows
+        self.batch_rows = batch_rows
+        self.linger_ms = linger_ms
+        self.default_deadline_ms = default_deadline_ms
+        self.address: tuple[str, int] | str | None = None
+
+        self._queue: asyncio.Queue[_Job] | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._server: asyncio.Server | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self._in_flight = 0
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "expired": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        self._latencies: deque[float] = deque(maxlen=4096)
+
+    # ── lifecycle ─────────────────────────────────────────────────────────
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, path: str | None = None
+    ) -> None:
+        """
+        Start the worker pool and listen on TCP `host:port` or Unix socket `path`.
+
+        With `port=0` an ephemeral port is chosen; see `self.address`.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        workers = self.workers or os.process_cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        # Keep at most two jobs per worker in the executor so that waiting
+        # work stays in our queue (and is visible in queue depth metrics)
+        self._slots = asyncio.Semaphore(2 * workers)
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        """Stop accepting connections, cancel pending work and shut down the pool."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self) -> OrderingServer:
+        if self._server is None:
+            await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    # ── submission and dispatch ───────────────────────────────────────────
+
+    def submit(
+        self,
+        tables: list[tuple[object, NDArray, list[list[int]], float | None]],
+    ) -> list[_Job]:
+        """
+        Enqueue tables for ordering, all or nothing.
+
+        Args:
+            tables: List of (table_id, table, functional_deps, deadline_ms);
+                    deadlines are None or non-negative numbers
+
+        Returns:
+            Jobs whose futures resolve to `_order_tables` results (tables are
+            expected to pass _check_table())
+
+        Raises:
+            asyncio.QueueFull: If the queue cannot take all tables
+        """
+        assert self._queue is not None, "server is not started"
+        if self._queue.qsize() + len(tables) > self.max_queue:
+            self._counters["rejected"] += len(tables)
+            raise asyncio.QueueFull
+
+        loop = asyncio.get_running_loop()
+        jobs = []
+        for table_id, table, functional_deps, deadline_ms in tables:
+            if deadline_ms is None:
+                deadline_ms = self.default_deadline_ms
+            deadline = None if deadline_ms is None else loop.time() + deadline_ms / 1000
+            jobs.append(
+                _Job(table_id, table, functional_deps, deadline, loop.create_future())
+            )
+        for job in jobs:
+            self._queue.put_nowait(job)
+        self._counters["submitted"] += len(jobs)
+        return jobs
+
+    async def _dispatch_loop(self) -> None:
+        assert self._queue is not None and self._slots is not None
+        loop = asyncio.get_running_loop()
+        pending: deque[_Job] = deque()
+        while True:
+            job = pending.popleft() if pending else await self._queue.get()
+            batch = [job]
+            if len(job.table) <= self.small_rows:
+                # Coalesce small tables until the batch is full or lingers too long
+                batch_rows = len(job.table)
+                linger_until = loop.time() + self.linger_ms / 1000
+                while batch_rows < self.batch_rows:
+                    timeout = linger_until - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                    if len(nxt.table) > self.small_rows:
+                        pending.append(nxt)
+                        break
+                    batch.append(nxt)
+                    batch_rows += len(nxt.table)
+
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[_Job]) -> None:
+        assert self._slots is not None
+        loop = asyncio.get_running_loop()
+        try:
+            now = loop.time()
+            live = []
+            for job in batch:
+                if job.future.done():
+                    continue
+                if job.deadline is not None and now >= job.deadline:
+                    self._counters["expired"] += 1
+                    job.future.set_exception(DeadlineExceeded())
+                else:
+                    live.append(job)
+            if not live:
+                return
+
+            self._in_flight += len(live)
+            self._counters["batches"] += 1
+            try:
+                results = await loop.run_in_executor(
+                    self._pool,
+                    _order_tables,
+                    [(job.table, job.functional_deps) for job in live],
+                )
+            except Exception as e:
+                self._counters["failed"] += len(live)
+                for job in live:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                return
+            finally:
+                self._in_flight -= len(live)
+
+            done = time.perf_counter()
+            for job, result in zip(live, results):
+                if isinstance(result, Exception):
+                    self._counters["failed"] += 1
+                    if not job.future.done():
+                        job.future.set_exception(result)
+                    continue
+                self._counters["completed"] += 1
+                self._latencies.append((done - job.enqueued) * 1000)
+                if not job.future.done():
+                    job.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    async def _await_job(self, job: _Job) -> dict:
+        """Wait for a job within its deadline and render its result line."""
+        loop = asyncio.get_running_loop()
+        timeout = None if job.deadline is None else max(job.deadline - loop.time(), 0)
+        try:
+            phc, orig_rows, col_orders, count = await asyncio.wait_for(
+                asyncio.shield(job.future), timeout
+            )
+        except (TimeoutError, DeadlineExceeded):
+            if not job.future.done():
+                # Still queued or running; drop the result when it arrives
+                self._counters["expired"] += 1
+                job.future.cancel()
+            return {"id": job.table_id, "error": "deadline exceeded"}
+        except Exception as e:
+            return {"id": job.table_id, "error": f"{type(e).__name__}: {e}"}
+        return {
+            "id": job.table_id,
+            "phc": phc,
+            "row_order": orig_rows,
+            "col_orders": col_orders,
+            "recursion_count": count,
+            "latency_ms": (time.perf_counter() - job.enqueued) * 1000,
+        }
+
+    def metrics(self) -> dict:
+        """Current queue depth, in-flight jobs, counters and latency percentiles (ms)."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)]
+
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight,
+            **self._counters,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+    # ── HTTP front-end ────────────────────────────────────────────────────
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0], request_line[1]
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                await _respond(writer, 400, {"error": "invalid Content-Length"})
+                return
+            body = await reader.readexactly(length)
+
+            if target == "/metrics":
+                if method != "GET":
+                    await _respond(writer, 405, {"error": "use GET"})
+                else:
+                    await _respond(writer, 200, self.metrics())
+            elif target == "/order":
+                if method != "POST":
+                    await _respond(writer, 405, {"error": "use POST"})
+                else:
+                    await self._handle_order(body, writer)
+            else:
+                await _respond(writer, 404, {"error": f"unknown path {target}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_order(self, body: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+            default_deadline = request.get("deadline_ms")
+            _check_deadline(default_deadline)
+            if not isinstance(request["tables"], list):
+                raise ValueError("tables must be a list")
+            tables = []
+            for i, spec in enumerate(request["tables"]):
+                if not isinstance(spec, dict):
+                    raise ValueError(f"table {i} must be a JSON object")
+                if "path" in spec:
+                    table = await asyncio.to_thread(load_csv_table, spec["path"])
+                else:
+                    table = np.array(spec["rows"], dtype=object)
+                functional_deps = spec.get("functional_deps", [])
+                deadline_ms = spec.get("deadline_ms", default_deadline)
+                try:
+                    _check_table(table, functional_deps)
+                    _check_deadline(deadline_ms)
+                except ValueError as e:
+                    raise ValueError(f"table {spec.get('id', i)}: {e}") from None
+                tables.append(
+                    (
+                        spec.get("id", i),
+                        table,
+                        functional_deps,
+                        deadline_ms,
+                    )
+                )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            await _respond(writer, 400, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        try:
+            jobs = self.submit(tables)
+        except asyncio.QueueFull:
+            await _respond(
+                writer, 503, {"error": "queue full"}, extra_headers={"Retry-After": "1"}
+            )
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        for next_result in asyncio.as_completed([self._await_job(job) for job in jobs]):
+            line = (json.dumps(await next_result) + "\n").encode()
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def _respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: dict,
+    extra_headers: dict[str, str] | None = None,
+) -> None:
+    body = json.dumps(payload).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "close",
+        **(extra_headers or {}),
+    }
+    head = f"HTTP/1.1 {status} {_REASONS[status]}\r\n" + "".join(
+        f"{k}: {v}\r\n" for k, v in headers.items()
+    )
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+
+
+class OrderingClient:
+    """
+    Minimal asyncio client for `OrderingServer` (TCP or Unix socket).
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int | None = None, path: str | None = None
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.path = path
+
+    async def _request(
+        self, method: str, target: str, payload: dict | None = None
+    ) -> tuple[int, dict[str, str], asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode()
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers, reader, writer
+
+    async def metrics(self) -> dict:
+        """Fetch server metrics."""
+        status, headers, reader, writer = await self._request("GET", "/metrics")
+        try:
+            return json.loads(await reader.readexactly(int(headers["content-length"])))
+        finally:
+            writer.close()
+
+    async def order(
+        self, tables: list[dict], deadline_ms: float | None = None
+    ) -> AsyncIterator[dict]:
+        """
+        Submit tables and yield result lines as the server streams them.
+
+        Args:
+            tables: Table specs as accepted by POST /order
+            deadline_ms: Default per-table deadline for this request
+
+        Yields:
+            One result dict per table, in completion order
+
+        Raises:
+            RuntimeError: If the server rejects the request (e.g. 503 queue full)
+        """
+        payload: dict = {"tables": tables}
+        if deadline_ms is not None:
+            payload["deadline_ms"] = deadline_ms
+        status, headers, reader, writer = await self._request("POST", "/order", payload)
+        try:
+            if status != 200:
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                raise RuntimeError(f"HTTP {status}: {body.decode()}")
+            buffer = b""
+            while size := int((await reader.readline()).strip(), 16):
+                buffer += await reader.readexactly(size)
+                await reader.readexactly(2)  # chunk CRLF
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield json.loads(line)
+        finally:
+            writer.close()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = OrderingServer(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        small_rows=args.small_rows,
+        batch_rows=args.batch_rows,
+        linger_ms=args.linger_ms,
+        default_deadline_ms=args.deadline_ms,
+    )
+    await server.start(args.host, args.port, args.unix)
+    print(f"GGR ordering server listening on {server.address}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async GGR ordering service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on a Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, help="process pool size (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=1024)
+    parser.add_argument("--small-rows", type=int, default=512)
+    parser.add_argument("--batch-rows", type=int, default=4096)
+    parser.add_argument("--linger-ms", type=float, default=2.0)
+    parser.add_argument("--deadline-ms", type=float, help="default per-table deadline")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Shared encoded table for several GGR queries over the same table.
+
+An analytics job often runs several LLM queries over one table, each on its
+own column subset with its own FD groups. `EncodedTable` encodes the table,
+the per-code length array and the distinct-value statistics of every column
+once; order() then runs GGR on any projection without touching the strings
+again. The first recursion step of a projection is derived from the cached
+per-column statistics, so it needs no sorting either.
+
+The handle is immutable after construction: concurrent queries only read the
+cached arrays, and nothing is re-read or re-encoded per query.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+from numpy.typing import NDArray
+
+from ggr_encoded import (
+    ColumnStats,
+    Ordering,
+    column_stats,
+    encode_tables,
+    order_encoded,
+)
+
+
+class EncodedTable:
+    """Table encoded once and ordered for any column subset and FD groups."""
+
+    def __init__(self, table: NDArray) -> None:
+        """
+        Args:
+            table: Input table as a 2D numpy array of strings
+        """
+        codes, lengths = encode_tables([table])
+        self.codes: NDArray = codes[0]
+        self.lengths: NDArray = lengths
+        self.n_rows, self.n_cols = self.codes.shape
+        self.stats: list[ColumnStats] = (
+            [column_stats(self.codes[:, c]) for c in range(self.n_cols)]
+            if self.n_rows > 0
+            else []
+        )
+        for array in (self.codes, self.lengths, *(a for st in self.stats for a in st)):
+            array.flags.writeable = False
+
+    def _columns(self, columns: Sequence[int] | None) -> list[int]:
+        if columns is None:
+            return list(range(self.n_cols))
+        columns = [int(c) for c in columns]
+        for c in columns:
+            if not 0 <= c < self.n_cols:
+                raise IndexError(f"column {c} out of range for {self.n_cols} columns")
+        if len(set(columns)) != len(columns):
+            raise ValueError(f"duplicate columns in {columns}")
+        return columns
+
+    def order(
+        self,
+        columns: Sequence[int] | None = None,
+        functional_deps: list[list[int]] | None = None,
+    ) -> Ordering:
+        """
+        Run GGR on a projection of the table.
+
+        Args:
+            columns: Table columns of the projection, in projection order
+                     (None: all columns)
+            functional_deps: FD groups as projection column indices
+
+        Returns:
+            Ordering of the projection; its column orders are projection
+            column indices, so `ordering.reordered(table[:, columns])` gives
+            the values
+        """
+        return self.order_many([(columns, functional_deps)])[0]
+
+    def order_many(
+        self,
+        queries: Sequence[tuple[Sequence[int] | None, list[list[int]] | None]],
+    ) -> list[Ordering]:
+        """
+        Run GGR on several projections in one engine invocation.
+
+        Args:
+            queries: (columns, functional_deps) of each projection, as in order()
+
+        Returns:
+            One Ordering per query, in input order
+        """
+        projections = []
+        functional_deps = []
+        root_stats = []
+        for columns, fds in queries:
+            columns = self._columns(columns)
+            projections.append(self.codes[:, columns])
+            functional_deps.append(fds or [])
+            root_stats.append([self.stats[c] for c in columns] if self.stats else None)
+        return order_encoded(projections, self.lengths, functional_deps, root_stats)
@@ -0,0 +1,324 @@
+"""
+Local-search post-optimization of a GGR ordering.
+
+GGR's greedy choices leave PHC behind on ties and correlated values (see the
+sub-optimality examples in docs/report). `improve_ordering()` applies moves
+to a finished ordering and keeps only those that do not lower PHC:
+
+- run merge: two separate runs of consecutive rows containing the same
+  (column, value) are joined, with that column moved to the front of every
+  row, so that the value becomes a shared prefix (relocates a block next to
+  its sibling);
+- column promotion: within a run of rows containing the same (column, value),
+  that column is moved right after the run's shared prefix (moves a column
+  within a group's order);
+- row relocation: a single row is moved next to a row it shares a
+  (column, value) with, its columns re-ordered to follow the neighbour's
+  leading fields.
+
+Rows are kept in a doubly linked list. A move's PHC change is evaluated only
+from the adjacent-row boundaries of the rows it touches, not by re-running
+compute_phc(). Merges with zero PHC change are accepted as plateau moves,
+since resolving a tie often takes two such merges before PHC rises;
+every other move must strictly raise PHC.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+
+from ggr import compute_phc
+
+_NONE = -1
+_EPS = 1e-9
+
+
+class _State:
+    """Ordering as a doubly linked list of rows."""
+
+    def __init__(self, reordered_list: list[list[str]], col_orders: list[list[int]]):
+        n = len(reordered_list)
+        self.values = [list(row) for row in reordered_list]
+        self.cols = [list(cols) for cols in col_orders]
+        self.prev = [r - 1 for r in range(n)]
+        self.next = [r + 1 if r + 1 < n else _NONE for r in range(n)]
+        self.head = 0 if n else _NONE
+
+    def hit_next(self, a: int) -> float:
+        """PHC of the boundary between row a and its next row."""
+        b = self.next[a]
+        if b == _NONE:
+            return 0.0
+        hit = 0.0
+        for x, y in zip(self.values[a], self.values[b]):
+            if x != y:
+                break
+            hit += len(x) ** 2
+        return hit
+
+    def unlink(self, first: int, last: int) -> None:
+        p, n = self.prev[first], self.next[last]
+        if p == _NONE:
+            self.head = n
+        else:
+            self.next[p] = n
+        if n != _NONE:
+            self.prev[n] = p
+        self.prev[first] = self.next[last] = _NONE
+
+    def link_after(self, q: int, first: int, last: int) -> None:
+        n = self.head if q == _NONE else self.next[q]
+        self.prev[first] = q
+        self.next[last] = n
+        if q == _NONE:
+            self.head = first
+        else:
+            self.next[q] = first
+        if n != _NONE:
+            self.prev[n] = last
+
+    def rows(self) -> list[int]:
+        order = []
+        r = self.head
+        while r != _NONE:
+            order.append(r)
+            r = self.next[r]
+        return order
+
+    def try_move(
+        self,
+        changes: dict[int, tuple[list[str], list[int]]],
+        segment: list[int] | None = None,
+        q: int = _NONE,
+        accept_zero: bool = False,
+    ) -> float | None:
+        """
+        Apply a move if it does not lower PHC, otherwise leave the state as is.
+
+        Args:
+            changes: New (values, cols) of re-ordered rows
+            segment: Consecutive rows moved right after row q (None: no move)
+            q: Row after which the segment is inserted
+            accept_zero: Also apply the move when PHC does not change
+
+        Returns:
+            PHC change of the applied move, or None if it was rejected
+        """
+        touched = set(changes)
+        if segment is not None:
+            touched.update(segment)
+        # Rows whose boundary with their next row can change
+        sources = touched | {self.prev[t] for t in touched}
+        if segment is not None:
+            pr = self.prev[segment[0]]
+            sources.update((q, pr))
+        sources.discard(_NONE)
+
+        before = sum(self.hit_next(x) for x in sources)
+        old = {r: (self.values[r], self.cols[r]) for r in changes}
+        for r, (values, cols) in changes.items():
+            self.values[r], self.cols[r] = values, cols
+        if segment is not None:
+            self.unlink(segment[0], segment[-1])
+            self.link_after(q, segment[0], segment[-1])
+        delta = sum(self.hit_next(x) for x in sources) - before
+
+        if delta > _EPS or (accept_zero and delta > -_EPS):
+            return delta
+        if segment is not None:
+            self.unlink(segment[0], segment[-1])
+            self.link_after(pr, segment[0], segment[-1])
+        for r, (values, cols) in old.items():
+            self.values[r], self.cols[r] = values, cols
+        return None
+
+
+def _promote(
+    values: list[str], cols: list[int], col: int, pos: int
+) -> tuple[list[str], list[int]]:
+    """Move the field of column `col` to position `pos`."""
+    i = cols.index(col)
+    if i == pos:
+        return values, cols
+    order = list(range(len(cols)))
+    order.insert(pos, order.pop(i))
+    return [values[j] for j in order], [cols[j] for j in order]
+
+
+def _aligned(s: _State, r: int, q: int) -> tuple[list[str], list[int]]:
+    """Row r re-ordered so that fields shared with q follow q's leading fields."""
+    position = {c: i for i, c in enumerate(s.cols[r])}
+    front: list[int] = []
+    for c, v in zip(s.cols[q], s.values[q]):
+        i = position.get(c)
+        if i is None or s.values[r][i] != v:
+            break
+        front.append(i)
+    taken = set(front)
+    order = front + [i for i in range(len(s.cols[r])) if i not in taken]
+    return [s.values[r][i] for i in order], [s.cols[r][i] for i in order]
+
+
+def _runs(
+    s: _State, keys: set[tuple[int, str]]
+) -> dict[tuple[int, str], list[list[int]]]:
+    """Maximal runs of consecutive rows containing each (column, value) key."""
+    runs: dict[tuple[int, str], list[list[int]]] = defaultdict(list)
+    open_runs: dict[tuple[int, str], list[int]] = {}
+    prev = _NONE
+    for r in s.rows():
+        for key in zip(s.cols[r], s.values[r]):
+            if key not in keys:
+                continue
+            run = open_runs.get(key)
+            if run is not None and run[-1] == prev:
+                run.append(r)
+            else:
+                open_runs[key] = [r]
+                runs[key].append(open_runs[key])
+        prev = r
+    return runs
+
+
+def _shared_prefix(s: _State, rows: list[int]) -> int:
+    """Number of leading (column, value) fields shared by all rows."""
+    first_values, first_cols = s.values[rows[0]], s.cols[rows[0]]
+    shared = len(first_cols)
+    for r in rows[1:]:
+        n = 0
+        for c, v, fc, fv in zip(s.cols[r], s.values[r], first_cols, first_values):
+            if c != fc or v != fv or n >= shared:
+                break
+            n += 1
+        shared = n
+    return shared
+
+
+def improve_ordering(
+    reordered_list: list[list[str]],
+    col_orders: list[list[int]],
+    orig_rows: list[int],
+    max_iters: int | None = None,
+    time_limit: float | None = None,
+    max_candidates: int = 16,
+) -> tuple[float, list[list[str]], list[list[int]], list[int], int]:
+    """
+    Raise the PHC of an ordering with local moves (first improvement).
+
+    Passes over all moves are repeated while a pass raises PHC and the budget
+    lasts. Rows touched by a move are not touched again in the same pass.
+    No applied move lowers PHC, so the result never scores below the input.
+
+    Args:
+        reordered_list: Reordered rows, as returned by ggr()
+        col_orders: Column order of each row, as returned by ggr()
+        orig_rows: Original row index of each row, as returned by ggr()
+        max_iters: Maximum number of evaluated moves (None: unlimited)
+        time_limit: Maximum run time in seconds (None: unlimited)
+        max_candidates: Maximum candidates tried per key or row
+
+    Returns:
+        Tuple of (prefix_hit_count, reordered_values, reordered_col_indices,
+                  original_row_indices, applied_moves)
+    """
+    s = _State(reordered_list, col_orders)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+    # Rows by (column, value); only keys present in 2+ rows can create hits
+    by_field: dict[tuple[int, str], list[int]] = defaultdict(list)
+    for r in range(len(reordered_list)):
+        for key in zip(s.cols[r], s.values[r]):
+            by_field[key].append(r)
+    shared_keys = {key for key, rows in by_field.items() if len(rows) > 1}
+
+    evaluated = 0
+    applied = 0
+
+    def exhausted() -> bool:
+        if max_iters is not None and evaluated >= max_iters:
+            return True
+        return deadline is not None and time.perf_counter() >= deadline
+
+    while not exhausted():
+        raised = False
+        dirty: set[int] = set()
+        runs = _runs(s, shared_keys)
+
+        # Run merge: join later runs of a key to its first run, key in front
+        for (col, _), key_runs in runs.items():
+            if len(key_runs) < 2 or exhausted():
+                continue
+            anchor = key_runs[0]
+            for run in key_runs[1 : 1 + max_candidates]:
+                if exhausted():
+                    break
+                if dirty.intersection(anchor) or dirty.intersection(run):
+                    continue
+                evaluated += 1
+                changes = {
+                    r: _promote(s.values[r], s.cols[r], col, 0) for r in anchor + run
+                }
+                delta = s.try_move(changes, run, anchor[-1], accept_zero=True)
+                if delta is not None:
+                    applied += 1
+                    raised |= delta > _EPS
+                    dirty.update(anchor, run)
+                    anchor = anchor + run
+
+        # Column promotion: move the key's column right after the run's shared prefix
+        for (col, _), key_runs in runs.items():
+            if exhausted():
+                break
+            for run in key_runs:
+                if len(run) < 2 or dirty.intersection(run):
+                    continue
+                pos = _shared_prefix(s, run)
+                if all(s.cols[r].index(col) <= pos for r in run):
+                    continue  # already shared or right after the shared prefix
+                evaluated += 1
+                changes = {r: _promote(s.values[r], s.cols[r], col, pos) for r in run}
+                if s.try_move(changes) is not None:
+                    applied += 1
+                    raised = True
+                    dirty.update(run)
+
+        # Row relocation next to a row sharing a (column, value)
+        for r in s.rows():
+            if exhausted():
+                break
+            if r in dirty:
+                continue
+            candidates: list[int] = []
+            for key in zip(s.cols[r], s.values[r]):
+                if key not in shared_keys:
+                    continue
+                for q in by_field[key]:
+                    if len(candidates) >= max_candidates:
+                        break
+                    if q != r and q not in dirty:
+                        candidates.append(q)
+            for q in candidates:
+                if exhausted():
+                    break
+                evaluated += 1
+                changes = {r: _aligned(s, r, q)}
+                segment = None if q == s.prev[r] else [r]
+                if s.try_move(changes, segment, q) is not None:
+                    applied += 1
+                    raised = True
+                    dirty.update((r, q))
+                    break
+
+        if not raised:
+            break
+
+    order = s.rows()
+    result_values = [s.values[r] for r in order]
+    return (
+        compute_phc(result_values),
+        result_values,
+        [s.cols[r] for r in order],
+        [orig_rows[r] for r in order],
+        applied,
+    )
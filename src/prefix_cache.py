@@ -0,0 +1,255 @@
+"""
+Finite-capacity prefix cache simulator and capacity-aware GGR ordering.
+
+`compute_phc()` scores an ordering under an unbounded cache where only
+adjacent rows share a prefix. Serving engines instead keep a radix tree of
+cached prefixes under a fixed KV-cache token budget, reuse non-adjacent
+prefixes, and evict least recently used leaves when the budget is exceeded.
+`PrefixCacheSimulator` replays an ordering through such a cache and reports
+the real hit rate.
+
+The tree is keyed by whole fields, one node per (column, value): equal values
+of different columns render as different prompt text (`brand: x` and
+`product: x`) and share nothing. A field of value `v` costs `token_len(v)`
+tokens (`len(v)` by default, matching the lengths used by PHC).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+
+from numpy.typing import NDArray
+
+from ggr import compute_phc
+from ggr_encoded import encode_tables, order_encoded
+
+
+class _Node:
+    __slots__ = ("key", "tokens", "parent", "children")
+
+    def __init__(
+        self, key: tuple[int, str] | None, tokens: int, parent: _Node | None
+    ) -> None:
+        self.key = key
+        self.tokens = tokens
+        self.parent = parent
+        self.children: dict[tuple[int, str], _Node] = {}
+
+
+@dataclass
+class CacheStats:
+    """Counters of a prefix cache replay (all sizes in tokens)."""
+
+    requests: int = 0
+    total_tokens: int = 0
+    hit_tokens: int = 0
+    evicted_tokens: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of prompt tokens served from the cache."""
+        return self.hit_tokens / self.total_tokens if self.total_tokens else 0.0
+
+
+class PrefixCacheSimulator:
+    """
+    Radix-tree prefix cache with a token capacity and LRU leaf eviction.
+
+    Nodes are kept in one LRU list. Each access touches its path from the
+    leaf up to the root, so a parent is always more recent than all of its
+    children and the least recently used node is always a leaf; eviction is
+    therefore O(1) per evicted node.
+    """
+
+    def __init__(
+        self, capacity: int, token_len: Callable[[str], int] = len
+    ) -> None:
+        """
+        Args:
+            capacity: KV-cache budget in tokens
+            token_len: Token count of a field value
+        """
+        self.capacity = capacity
+        self.token_len = token_len
+        self.used_tokens = 0
+        self.stats = CacheStats()
+        self._root = _Node(None, 0, None)
+        self._lru: OrderedDict[_Node, None] = OrderedDict()
+
+    def access(self, values: Iterable[str], cols: Iterable[int]) -> int:
+        """
+        Serve one request (a row of field values) and cache its prefixes.
+
+        Args:
+            values: Field values of the request in prompt order
+            cols: Column of each field
+
+        Returns:
+            Number of prompt tokens served from the cache
+        """
+        fields = list(zip(cols, values))
+        node = self._root
+        path: list[_Node] = []
+        hit = 0
+        i = 0
+        # Walk down the cached part of the prompt
+        while i < len(fields) and fields[i] in node.children:
+            node = node.children[fields[i]]
+            path.append(node)
+            hit += node.tokens
+            i += 1
+        total = hit + sum(self.token_len(v) for _, v in fields[i:])
+
+        # Pin the matched path at the most recent end before evicting
+        for n in reversed(path):
+            self._lru.move_to_end(n)
+
+        # Insert the uncached suffix, evicting LRU leaves to make room
+        for key in fields[i:]:
+            tokens = self.token_len(key[1])
+            if not self._make_room(tokens, pinned=len(path)):
+                break  # the prompt does not fit into the cache
+            child = _Node(key, tokens, node)
+            node.children[key] = child
+            self._lru[child] = None
+            self.used_tokens += tokens
+            path.append(child)
+            node = child
+
+        for n in reversed(path):
+            self._lru.move_to_end(n)
+
+        self.stats.requests += 1
+        self.stats.total_tokens += total
+        self.stats.hit_tokens += hit
+        return hit
+
+    def _make_room(self, tokens: int, pinned: int) -> bool:
+        """Evict LRU leaves until `tokens` fit; never evict the `pinned` current path."""
+        while self.used_tokens + tokens > self.capacity:
+            if len(self._lru) <= pinned:
+                return False
+            victim, _ = self._lru.popitem(last=False)
+            del victim.parent.children[victim.key]
+            self.used_tokens -= victim.tokens
+            self.stats.evicted_tokens += victim.tokens
+        return True
+
+
+def simulate(
+    reordered_list: Iterable[list[str]],
+    col_orders: Iterable[list[int]],
+    capacity: int,
+    token_len: Callable[[str], int] = len,
+) -> CacheStats:
+    """
+    Replay an ordering through a finite-capacity LRU prefix cache.
+
+    Args:
+        reordered_list: Rows (lists of field values) in serving order
+        col_orders: Column order of each row, as returned by ggr()
+        capacity: KV-cache budget in tokens
+        token_len: Token count of a field value
+
+    Returns:
+        Cache statistics of the replay, including the hit rate
+    """
+    cache = PrefixCacheSimulator(capacity, token_len)
+    for row, cols in zip(reordered_list, col_orders):
+        cache.access(row, cols)
+    return cache.stats
+
+
+def regroup_prefixes(
+    reordered_list: list[list[str]], col_orders: list[list[int]]
+) -> list[int]:
+    """
+    Stable reorder making every shared prefix occupy one contiguous block.
+
+    At each field depth, rows sharing the preceding prefix are split into runs
+    of equal value, and all runs of a value are pulled up to its first run
+    (prefix-tree DFS order). Moved runs only ever border runs that share the
+    same preceding prefix, so the adjacent-row PHC never decreases. In this
+    order every cached prefix is used in one contiguous interval, so an LRU
+    cache that can hold the longest prompt attains the maximal hit count for
+    the given prompts.
+
+    Args:
+        reordered_list: Rows (lists of field values), e.g. the output of ggr()
+        col_orders: Column order of each row, e.g. the output of ggr()
+
+    Returns:
+        New order as a list of positions into `reordered_list`
+    """
+
+    def regroup(rows: list[int], depth: int) -> list[int]:
+        clusters: list[list[int]] = []
+        cluster_of: dict[tuple[int, str], int] = {}
+        for r in rows:
+            row = reordered_list[r]
+            if depth >= len(row):
+                # Row has no field at this depth: it cannot share anything more
+                clusters.append([r])
+                continue
+            key = (col_orders[r][depth], row[depth])
+            if key in cluster_of:
+                clusters[cluster_of[key]].append(r)
+            else:
+                cluster_of[key] = len(clusters)
+                clusters.append([r])
+
+        order = []
+        for cluster in clusters:
+            if len(cluster) > 1:
+                order.extend(regroup(cluster, depth + 1))
+            else:
+                order.extend(cluster)
+        return order
+
+    return regroup(list(range(len(reordered_list))), 0)
+
+
+def ggr_capacity(
+    table: NDArray,
+    functional_deps: list[list[int]],
+    capacity: int,
+    token_len: Callable[[str], int] = len,
+) -> tuple[float, list[list[str]], list[list[int]], list[int], int]:
+    """
+    GGR with group choices made for a prefix cache of `capacity` tokens.
+
+    GGR output serves every shared prefix in one contiguous block, so an LRU
+    cache keeps a group's prefix for as long as the group needs it, but only
+    the fields that fit into the capacity behind the prefix already shared
+    can ever be served from the cache. ggr() ranks groups as if the cache
+    were unbounded, so it may open a group whose fields lie past the
+    capacity before a group that would actually be served. Here each step
+    scores the fields of a candidate group in `token_len` units, counting a
+    field only if it still fits into the capacity after the shared prefix
+    and the group's earlier fields. Groups that cannot fit are not formed,
+    and the rows are emitted as they are once no group fits. With an
+    unbounded capacity and `token_len=len` the choices are those of ggr().
+
+    Args:
+        table: Input table as a 2D numpy array of strings
+        functional_deps: List of disjoint sets of mutually dependent column indices
+        capacity: KV-cache budget in tokens
+        token_len: Token count of a field value
+
+    Returns:
+        Same tuple as ggr(): (prefix_hit_count, reordered_values,
+        reordered_col_indices, original_row_indices, recursion_count), where
+        prefix_hit_count is compute_phc() of the returned ordering
+    """
+    codes, lengths = encode_tables([table], token_len)
+    ordering = order_encoded(codes, lengths, [functional_deps], capacity=capacity)[0]
+    reordered = ordering.reordered(table).tolist()
+    return (
+        compute_phc(reordered),
+        reordered,
+        ordering.col_orders.tolist(),
+        ordering.row_order.tolist(),
+        ordering.recursion_count,
+    )
@@ -0,0 +1,214 @@
+"""
+Prompt serialization of GGR output.
+
+Turns the reordered rows produced by ggr() into prompt strings. Consecutive
+rows sharing leading fields are emitted as one `PromptBatch` whose shared
+prefix (system prompt + shared "field: value" lines) is rendered once and
+referenced by every request of the batch; only the per-row suffix is built per
+row. Groups nested deeper in the GGR ordering get their own batches, whose
+prefix extends the enclosing one. `prefix + suffix` is byte-identical to
+`PromptTemplate.render()`.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TextIO
+
+from numpy.typing import NDArray
+
+
+@dataclass
+class PromptTemplate:
+    """
+    Prompt layout: a system prompt followed by one rendered line per field.
+
+    Attributes:
+        field_names: Field name per column index of the original table
+        system_prompt: Text preceding the fields
+        field_format: Format of one field, with `{name}` and `{value}` placeholders
+    """
+
+    field_names: list[str]
+    system_prompt: str = ""
+    field_format: str = "{name}: {value}\n"
+
+    def render_field(self, col_idx: int, value: str) -> str:
+        """Render a single field of column `col_idx`."""
+        return self.field_format.format(name=self.field_names[col_idx], value=value)
+
+    def render(self, values: list[str], cols: list[int]) -> str:
+        """Render a full prompt naively (reference for the batched rendering)."""
+        return self.system_prompt + "".join(
+            self.render_field(c, v) for c, v in zip(cols, values)
+        )
+
+
+@dataclass
+class PromptBatch:
+    """
+    Consecutive requests sharing a rendered prefix.
+
+    Attributes:
+        prefix: Shared prefix, rendered once for the whole batch
+        suffixes: Per-request remainder after the prefix
+        row_ids: Original row index of each request
+    """
+
+    prefix: str
+    suffixes: list[str] = field(default_factory=list)
+    row_ids: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.suffixes)
+
+    def prompts(self) -> Iterator[str]:
+        """Yield the full prompt of each request."""
+        for suffix in self.suffixes:
+            yield self.prefix + suffix
+
+
+def _shared_fields(
+    values: list[str], cols: list[int], first_values: list[str], first_cols: list[int]
+) -> int:
+    """Number of leading fields (same column and value) shared by two rows."""
+    n = 0
+    for v, c, fv, fc in zip(values, cols, first_values, first_cols):
+        if c != fc or v != fv:
+            break
+        n += 1
+    return n
+
+
+def serialize(
+    reordered_list: list[list[str]] | NDArray,
+    col_orders: list[list[int]] | NDArray,
+    orig_rows: list[int] | NDArray,
+    template: PromptTemplate,
+    min_shared_fields: int = 1,
+) -> Iterator[PromptBatch]:
+    """
+    Render GGR output as a stream of prefix-grouped prompt batches.
+
+    Rows are grouped into maximal runs of consecutive rows sharing at least
+    `min_shared_fields` leading fields with the run's first row. Within a
+    run, consecutive rows sharing more leading fields form nested batches
+    whose prefix is the enclosing prefix plus the extra shared fields, so
+    every shared prefix of the GGR group tree is rendered once. Each
+    distinct (column, value) field is formatted once.
+
+    The ggr() lists and the numpy arrays of the compact `Ordering` format
+    (`ordering.reordered(table)`, `col_orders`, `row_order`) are both
+    accepted; row ids are stored as Python ints.
+
+    Args:
+        reordered_list: Reordered rows, as returned by ggr()
+        col_orders: Column order of each row, as returned by ggr()
+        orig_rows: Original row index of each row, as returned by ggr()
+        template: Prompt template
+        min_shared_fields: Minimum leading fields shared to stay in a run
+
+    Yields:
+        Prompt batches in the order of `reordered_list`
+    """
+    min_shared_fields = max(min_shared_fields, 1)
+    n_rows = len(reordered_list)
+    rendered: dict[tuple[int, str], str] = {}
+
+    def render_fields(values: list[str], cols: list[int]) -> str:
+        parts = []
+        for c, v in zip(cols, values):
+            text = rendered.get((c, v))
+            if text is None:
+                text = rendered[(c, v)] = template.render_field(c, v)
+            parts.append(text)
+        return "".join(parts)
+
+    def shared_with(r: int, first: int) -> int:
+        return _shared_fields(
+            reordered_list[r], col_orders[r], reordered_list[first], col_orders[first]
+        )
+
+    def batches(lo: int, hi: int, depth: int, prefix: str) -> Iterator[PromptBatch]:
+        """Batches of rows lo..hi-1, which share `depth` fields rendered in `prefix`."""
+        batch = PromptBatch(prefix)
+        r = lo
+        while r < hi:
+            end = r + 1
+            while end < hi and shared_with(end, r) > depth:
+                end += 1
+            values, cols = reordered_list[r], col_orders[r]
+            if end - r > 1:
+                if batch:
+                    yield batch
+                    batch = PromptBatch(prefix)
+                shared = min(shared_with(x, r) for x in range(r + 1, end))
+                yield from batches(
+                    r,
+                    end,
+                    shared,
+                    prefix + render_fields(values[depth:shared], cols[depth:shared]),
+                )
+            else:
+                batch.suffixes.append(render_fields(values[depth:], cols[depth:]))
+                batch.row_ids.append(int(orig_rows[r]))
+            r = end
+        if batch:
+            yield batch
+
+    start = 0
+    while start < n_rows:
+        first_values, first_cols = reordered_list[start], col_orders[start]
+        shared = len(first_values)
+        end = start + 1
+        while end < n_rows:
+            n = shared_with(end, start)
+            if n < min_shared_fields:
+                break
+            shared = min(shared, n)
+            end += 1
+
+        prefix = template.system_prompt + render_fields(
+            first_values[:shared], first_cols[:shared]
+        )
+        yield from batches(start, end, shared, prefix)
+        start = end
+
+
+def write_jsonl(
+    batches: Iterable[PromptBatch],
+    fp: TextIO,
+    id_key: str = "custom_id",
+    prompt_key: str = "prompt",
+) -> int:
+    """
+    Write one JSON object per request for offline batch inference APIs.
+
+    Each line equals `json.dumps({id_key: row_id, prompt_key: prompt})`; the
+    escaped shared prefix is computed once per batch and reused for every
+    request of the batch.
+
+    Args:
+        batches: Prompt batches, e.g. from serialize()
+        fp: Text file opened for writing
+        id_key: Key of the original row index
+        prompt_key: Key of the prompt text
+
+    Returns:
+        Number of requests written
+    """
+    head = f"{json.dumps(id_key)}: "
+    mid = f", {json.dumps(prompt_key)}: "
+    count = 0
+    for batch in batches:
+        # Drop the closing quote of the prefix and the opening one of each suffix
+        escaped_prefix = json.dumps(batch.prefix)[:-1]
+        for row_id, suffix in zip(batch.row_ids, batch.suffixes):
+            fp.write(
+                "{" + head + json.dumps(row_id) + mid
+                + escaped_prefix + json.dumps(suffix)[1:] + "}\n"
+            )
+        count += len(batch)
+    return count
@@ -0,0 +1,139 @@
+"""Offline tests of the GGR ordering service against a local client."""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from ggr import ggr
+from ggr_server import OrderingClient, OrderingServer
+
+TABLE = [
+    ["Electronics", "Apple", "iPhone", "EL"],
+    ["Clothing", "Nike", "Shoes", "CL"],
+    ["Electronics", "Samsung", "TV", "EL"],
+    ["Clothing", "Adidas", "Shoes", "CL"],
+    ["Electronics", "Apple", "MacBook", "EL"],
+    ["Clothing", "Nike", "T-Shirt", "CL"],
+]
+
+
+def _run(test, **server_args):
+    """Run `test(server, client)` against a server on an ephemeral TCP port."""
+
+    async def main():
+        async with OrderingServer(workers=1, **server_args) as server:
+            host, port = server.address
+            return await test(server, OrderingClient(host, port))
+
+    return asyncio.run(main())
+
+
+async def _collect(client, tables, **kwargs):
+    return [line async for line in client.order(tables, **kwargs)]
+
+
+async def _raw(address, data: bytes) -> tuple[int, dict]:
+    """Send raw bytes and parse a Content-Length response."""
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_streams_one_result_per_table():
+    async def test(server, client):
+        tables = [
+            {"id": "a", "rows": TABLE, "functional_deps": [[0, 3]]},
+            {"id": "b", "rows": TABLE[:3]},
+            {"id": "c", "rows": [["x"]]},
+        ]
+        results = {r["id"]: r for r in await _collect(client, tables)}
+        return results, await client.metrics()
+
+    results, metrics = _run(test)
+    assert set(results) == {"a", "b", "c"}
+    expected = ggr(np.array(TABLE, dtype=object), [[0, 3]])
+    assert results["a"]["phc"] == pytest.approx(expected[0])
+    assert sorted(results["a"]["row_order"]) == list(range(len(TABLE)))
+    assert all(sorted(cols) == [0, 1, 2, 3] for cols in results["a"]["col_orders"])
+    assert results["c"]["row_order"] == [0]
+    assert metrics["completed"] == 3
+    assert metrics["queue_depth"] == 0
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "ggr.sock")
+
+    async def main():
+        async with OrderingServer(workers=1) as server:
+            await server.close()
+            await server.start(path=path)
+            return await _collect(OrderingClient(path=path), [{"rows": TABLE}])
+
+    (result,) = asyncio.run(main())
+    assert result["id"] == 0
+    assert sorted(result["row_order"]) == list(range(len(TABLE)))
+
+
+def test_full_queue_rejects_whole_request():
+    async def test(server, client):
+        with pytest.raises(RuntimeError, match="HTTP 503"):
+            await _collect(client, [{"rows": TABLE}, {"rows": TABLE}])
+        return await client.metrics()
+
+    metrics = _run(test, max_queue=1)
+    assert metrics["rejected"] == 2
+    assert metrics["submitted"] == 0
+
+
+def test_deadline_expiry():
+    async def test(server, client):
+        return await _collect(client, [{"id": "late", "rows": TABLE}], deadline_ms=0)
+
+    (result,) = _run(test)
+    assert result == {"id": "late", "error": "deadline exceeded"}
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        ([1, 2], "JSON object"),
+        ({"tables": [1]}, "JSON object"),
+        ({"tables": [{"rows": [["a", 1], ["b", 2]]}]}, "strings"),
+        ({"tables": [{"rows": [["a", "x"]], "functional_deps": [[0, 5]]}]}, "range"),
+        ({"tables": [{"rows": [["a", "x"]], "functional_deps": [[0], [0]]}]}, "group"),
+        ({"tables": [{"rows": []}]}, "non-empty"),
+        ({"tables": [{"rows": TABLE}, {"rows": TABLE, "deadline_ms": "x"}]}, "deadline"),
+        ({"tables": [{"rows": TABLE}], "deadline_ms": -1}, "deadline"),
+    ],
+)
+def test_invalid_request_is_rejected(payload, message):
+    async def test(server, client):
+        body = json.dumps(payload).encode()
+        response = await _raw(
+            server.address,
+            b"POST /order HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body),
+        )
+        return response, server.metrics()
+
+    (status, body), metrics = _run(test)
+    assert status == 400
+    assert message in body["error"]
+    assert metrics["submitted"] == 0
+    assert metrics["queue_depth"] == 0
+
+
+def test_invalid_content_length():
+    async def test(server, client):
+        return await _raw(
+            server.address, b"POST /order HTTP/1.1\r\nContent-Length: abc\r\n\r\n"
+        )
+
+    status, body = _run(test)
+    assert status == 400
+    assert "Content-Length" in body["error"]